@@ -1,6 +1,5 @@
 import streamlit as st
 import pandas as pd
-import json
 import os
 
 # Construct a robust path to the events file.
@@ -9,32 +8,41 @@ script_dir = os.path.dirname(__file__)
 project_root = os.path.abspath(os.path.join(script_dir, '..'))
 EVENTS_FILE_PATH = os.path.join(project_root, 'evidence/output/test/events.jsonl')
 
+@st.cache_data(show_spinner=False)
+def _read_events(filepath, mtime):
+    """Parses the events file into a flat DataFrame; cached until its modification time changes."""
+    # Parse the whole file with pandas' C JSON reader
+    events_df = pd.read_json(filepath, lines=True, convert_dates=False)
+
+    # Flatten the nested event data into 'event_data.*' columns
+    event_data_df = pd.json_normalize(events_df['event_data'].tolist()).add_prefix('event_data.')
+    df = events_df.drop(columns='event_data').join(event_data_df)
+    # Rename columns for clarity
+    df.rename(columns={
+        'event_data.event_name': 'Event Name',
+        'event_data.station_id': 'Station ID',
+        'timestamp': 'Timestamp'
+    }, inplace=True)
+    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+    return df
+
+@st.cache_data(show_spinner=False)
+def _count_events(filepath, mtime):
+    """Counts events per event name; cached the same way as _read_events."""
+    return _read_events(filepath, mtime)['Event Name'].value_counts()
+
 def load_events(filepath):
     """Loads events from a JSONL file."""
-    events = []
     if not os.path.exists(filepath):
         st.error(f"Events file not found at: {os.path.abspath(filepath)}")
         st.info("Please run the data processing pipeline first to generate the events.jsonl file.")
         return pd.DataFrame()
 
-    with open(filepath, 'r') as f:
-        for line in f:
-            events.append(json.loads(line))
-
-    if not events:
+    if os.path.getsize(filepath) == 0:
         st.warning("No events found in the output file.")
         return pd.DataFrame()
 
-    # Normalize the nested JSON data into a flat DataFrame
-    df = pd.json_normalize(events)
-    # Rename columns for clarity
-    df.rename(columns={
-        'event_data.event_name': 'Event Name',
-        'event_data.station_id': 'Station ID',
-        'timestamp': 'Timestamp'
-    }, inplace=True)
-    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-    return df
+    return _read_events(filepath, os.path.getmtime(filepath))
 
 def run_dashboard():
     """
@@ -58,7 +66,7 @@ def run_dashboard():
         st.header("Event Analysis")
 
         # Bar chart of event counts
-        event_counts = events_df['Event Name'].value_counts()
+        event_counts = _count_events(EVENTS_FILE_PATH, os.path.getmtime(EVENTS_FILE_PATH))
         st.bar_chart(event_counts)
 
         # Detailed event log (filterable)
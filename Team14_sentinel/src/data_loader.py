@@ -9,13 +9,17 @@ def load_csv_data(data_dir):
         data_dir (str): The path to the input data directory.
 
     Returns:
-        tuple: A tuple containing the products DataFrame and customers DataFrame.
+        tuple: A tuple containing the products DataFrame (SKU, weight) and
+            customers DataFrame (Customer_ID).
     """
     products_path = os.path.join(data_dir, 'products_list.csv')
     customers_path = os.path.join(data_dir, 'customer_data.csv')
 
-    products_df = pd.read_csv(products_path)
-    customers_df = pd.read_csv(customers_path)
+    # Only the columns used downstream are materialized. The C engine is kept over
+    # engine='pyarrow' because the products file starts with a whitespace-only line,
+    # which only the C engine skips.
+    products_df = pd.read_csv(products_path, usecols=['SKU', 'weight'], dtype={'SKU': 'string'})
+    customers_df = pd.read_csv(customers_path, usecols=['Customer_ID'], dtype={'Customer_ID': 'string'})
 
     print("Successfully loaded products and customer data.")
     return products_df, customers_df
@@ -1,10 +1,51 @@
 # This module will contain the functions to detect specific events
 # from the processed data streams.
 
+import numpy as np
 import pandas as pd
-from datetime import timedelta
 
-def detect_scanner_avoidance(pos_data, rfid_data, time_window_seconds=10):
+NS_PER_SECOND = 1_000_000_000
+
+def _isoformat(timestamps):
+    """
+    Formats a datetime Series exactly like Timestamp.isoformat(), vectorized where possible.
+    Tz-aware values keep their UTC offset; values with nonzero nanoseconds, offsets with
+    seconds and NaT fall back to Timestamp.isoformat().
+    """
+    iso = timestamps.dt.strftime('%Y-%m-%dT%H:%M:%S')
+    fractional = timestamps.dt.microsecond != 0
+    if fractional.any():
+        iso[fractional] = timestamps[fractional].dt.strftime('%Y-%m-%dT%H:%M:%S.%f')
+    fallback = timestamps.isna() | (timestamps.dt.nanosecond != 0)
+    if timestamps.dt.tz is not None:
+        # strftime gives '+0530'; isoformat writes the offset as '+05:30'
+        offset = timestamps.dt.strftime('%z')
+        iso = iso + offset.str[:3] + ':' + offset.str[3:]
+        fallback |= offset.str.len() != 5
+    if fallback.any():
+        iso[fallback] = timestamps[fallback].map(lambda ts: ts.isoformat())
+    return iso
+
+def _unify_categories(left, right, columns):
+    """Returns copies of both frames whose categorical `columns` share one set of categories, as merges require."""
+    for col in columns:
+        if left[col].dtype == right[col].dtype:
+            continue
+        if isinstance(left[col].dtype, pd.CategoricalDtype) and isinstance(right[col].dtype, pd.CategoricalDtype):
+            dtype = pd.CategoricalDtype(left[col].cat.categories.union(right[col].cat.categories))
+            left = left.assign(**{col: left[col].astype(dtype)})
+            right = right.assign(**{col: right[col].astype(dtype)})
+    return left, right
+
+def _event_records(df, columns):
+    """Returns the given columns as a list of dicts, with 'timestamp' as an ISO string."""
+    return df[columns].assign(timestamp=_isoformat(df['timestamp'])).to_dict(orient='records')
+
+def _event_rows(df, columns):
+    """Iterates the given columns as plain tuples, with 'timestamp' as an ISO string."""
+    return df[columns].assign(timestamp=_isoformat(df['timestamp'])).itertuples(index=False, name=None)
+
+def detect_scanner_avoidance(pos_df, rfid_df, time_window_seconds=10):
     """
     Detects instances of scanner avoidance.
     Event E001.
@@ -12,60 +53,63 @@ def detect_scanner_avoidance(pos_data, rfid_data, time_window_seconds=10):
     # @algorithm Scanner Avoidance | Detects when an item passes RFID but is not scanned at POS.
     print("Detecting scanner avoidance...")
 
-    if not rfid_data or not pos_data:
+    if rfid_df.empty or pos_df.empty:
         return []
 
-    # Convert to DataFrames for easier manipulation
-    rfid_df = pd.DataFrame(rfid_data)
-    pos_df = pd.DataFrame(pos_data)
+    # Filter out null RFID readings
+    rfid_df = rfid_df.dropna(subset=['sku'])
 
-    # Unpack nested data
-    rfid_df = pd.concat([rfid_df.drop(['data'], axis=1), rfid_df['data'].apply(pd.Series)], axis=1)
-    pos_df = pd.concat([pos_df.drop(['data'], axis=1), pos_df['data'].apply(pd.Series)], axis=1)
+    # Only readings taken at the checkout can be matched against POS scans
+    rfid_df = rfid_df[rfid_df['location'] == 'Checkout'].sort_values('timestamp', kind='stable')
+    pos_df = pos_df.sort_values('timestamp', kind='stable')
 
-    # Filter out null RFID readings and convert timestamp
-    rfid_df = rfid_df.dropna(subset=['sku'])
-    rfid_df['timestamp'] = pd.to_datetime(rfid_df['timestamp'])
-    pos_df['timestamp'] = pd.to_datetime(pos_df['timestamp'])
-
-    events = []
-
-    # Iterate through RFID readings that are not at the entrance/exit
-    for _, rfid_item in rfid_df[rfid_df['location'] == 'Checkout'].iterrows():
-        # Check if a matching SKU was scanned at the same station within the time window
-        is_scanned = any(
-            (pos_item['sku'] == rfid_item['sku']) and
-            (pos_item['station_id'] == rfid_item['station_id']) and
-            (rfid_item['timestamp'] <= pos_item['timestamp'] <= rfid_item['timestamp'] + timedelta(seconds=time_window_seconds))
-            for _, pos_item in pos_df.iterrows()
-        )
-
-        if not is_scanned:
-            # Find the customer at that station around that time
-            # This is an approximation: find the customer who checked out just after the RFID event
-            potential_customers = pos_df[
-                (pos_df['station_id'] == rfid_item['station_id']) &
-                (pos_df['timestamp'] > rfid_item['timestamp'])
-            ]
-
-            customer_id = "N/A"
-            if not potential_customers.empty:
-                customer_id = potential_customers.iloc[0]['customer_id']
-
-            events.append({
-                "timestamp": rfid_item['timestamp'].isoformat(),
-                "event_id": "E001",
-                "event_data": {
-                    "event_name": "Scanner Avoidance",
-                    "station_id": rfid_item['station_id'],
-                    "customer_id": customer_id,
-                    "product_sku": rfid_item['sku']
-                }
-            })
+    if rfid_df.empty:
+        return []
+
+    rfid_df, pos_df = _unify_categories(rfid_df, pos_df, ['station_id', 'sku'])
+
+    # Match each RFID read with the next scan of the same SKU at the same station within the time window
+    scans = pos_df[['timestamp', 'station_id', 'sku']].assign(scan_timestamp=pos_df['timestamp'])
+    merged_df = pd.merge_asof(
+        rfid_df[['timestamp', 'station_id', 'sku']],
+        scans,
+        on='timestamp',
+        by=['station_id', 'sku'],
+        direction='forward',
+        tolerance=pd.Timedelta(seconds=time_window_seconds)
+    )
+    unscanned_df = merged_df[merged_df['scan_timestamp'].isna()]
+
+    # Find the customer at that station around that time
+    # This is an approximation: find the customer who checked out just after the RFID event
+    customers = pos_df[['timestamp', 'station_id', 'customer_id']]
+    unscanned_df = pd.merge_asof(
+        unscanned_df,
+        customers,
+        on='timestamp',
+        by='station_id',
+        direction='forward',
+        allow_exact_matches=False
+    )
+    unscanned_df['customer_id'] = unscanned_df['customer_id'].astype(object).fillna("N/A")
+
+    events = [
+        {
+            "timestamp": row['timestamp'],
+            "event_id": "E001",
+            "event_data": {
+                "event_name": "Scanner Avoidance",
+                "station_id": row['station_id'],
+                "customer_id": row['customer_id'],
+                "product_sku": row['sku']
+            }
+        }
+        for row in _event_records(unscanned_df, ['timestamp', 'station_id', 'customer_id', 'sku'])
+    ]
 
     return events
 
-def detect_barcode_switching(vision_data, pos_data, time_window_seconds=3):
+def detect_barcode_switching(vision_df, pos_df, time_window_seconds=3):
     """
     Detects instances of barcode switching.
     Event E002.
@@ -73,21 +117,13 @@ def detect_barcode_switching(vision_data, pos_data, time_window_seconds=3):
     # @algorithm Barcode Switching | Compares vision system data with POS data to find mismatches.
     print("Detecting barcode switching...")
 
-    if not vision_data or not pos_data:
+    if vision_df.empty or pos_df.empty:
         return []
 
-    vision_df = pd.DataFrame(vision_data)
-    pos_df = pd.DataFrame(pos_data)
-
-    # Unpack nested data and convert timestamps
-    vision_df = pd.concat([vision_df.drop(['data'], axis=1), vision_df['data'].apply(pd.Series)], axis=1)
-    pos_df = pd.concat([pos_df.drop(['data'], axis=1), pos_df['data'].apply(pd.Series)], axis=1)
-    vision_df['timestamp'] = pd.to_datetime(vision_df['timestamp'])
-    pos_df['timestamp'] = pd.to_datetime(pos_df['timestamp'])
-
     # Sort by timestamp to prepare for merge_asof
     vision_df = vision_df.sort_values('timestamp')
     pos_df = pos_df.sort_values('timestamp')
+    vision_df, pos_df = _unify_categories(vision_df, pos_df, ['station_id'])
 
     # Merge vision events with the nearest POS event at the same station within a time tolerance
     merged_df = pd.merge_asof(
@@ -103,10 +139,9 @@ def detect_barcode_switching(vision_data, pos_data, time_window_seconds=3):
     mismatched_df = merged_df.dropna(subset=['predicted_product', 'sku'])
     mismatched_df = mismatched_df[mismatched_df['predicted_product'] != mismatched_df['sku']]
 
-    events = []
-    for _, row in mismatched_df.iterrows():
-        events.append({
-            "timestamp": row['timestamp'].isoformat(),
+    events = [
+        {
+            "timestamp": row['timestamp'],
             "event_id": "E002",
             "event_data": {
                 "event_name": "Barcode Switching",
@@ -115,89 +150,111 @@ def detect_barcode_switching(vision_data, pos_data, time_window_seconds=3):
                 "actual_sku": row['predicted_product'],
                 "scanned_sku": row['sku']
             }
-        })
+        }
+        for row in _event_records(mismatched_df, ['timestamp', 'station_id', 'customer_id', 'predicted_product', 'sku'])
+    ]
 
     return events
 
-def detect_weight_discrepancies(pos_data, products_df, tolerance=0.10):
+def detect_weight_discrepancies(pos_df, weight_lookup, tolerance=0.10):
     """
     Detects weight discrepancies in transactions.
     Event E003.
+
+    `weight_lookup` maps each product SKU to its expected weight.
     """
     # @algorithm Weight Discrepancy | Checks for significant differences between weighed and expected item weights.
     print("Detecting weight discrepancies...")
 
-    if not pos_data or products_df.empty:
+    if pos_df.empty or not weight_lookup:
         return []
 
-    pos_df = pd.DataFrame(pos_data)
-    pos_df = pd.concat([pos_df.drop(['data'], axis=1), pos_df['data'].apply(pd.Series)], axis=1)
-    pos_df['timestamp'] = pd.to_datetime(pos_df['timestamp'])
-
-    # Merge with product data to get the expected weight
-    merged_df = pos_df.merge(products_df, left_on='sku', right_on='SKU')
+    # Look up the expected weight; SKUs missing from the product list map to NaN and never match
+    # Grocery weights do not need float64 precision; float32 halves the memory traffic
+    expected = pos_df['sku'].map(weight_lookup).to_numpy(dtype=np.float32, na_value=np.nan)
+    actual = pos_df['weight_g'].to_numpy(dtype=np.float32, na_value=np.nan)
 
     # Calculate the absolute difference and check against tolerance
     # The product weight is in kg, POS weight is in g. Let's assume product 'weight' is in grams for now based on context.
     # If it were kg, the discrepancies would be massive. Let's proceed assuming grams.
-    merged_df['weight_diff'] = abs(merged_df['weight_g'] - merged_df['weight'])
-    merged_df['is_discrepancy'] = merged_df['weight_diff'] > (merged_df['weight'] * tolerance)
+    is_discrepancy = np.abs(actual - expected) > expected * tolerance
 
-    discrepancy_df = merged_df[merged_df['is_discrepancy']]
+    discrepancy_df = pos_df[is_discrepancy]
 
-    events = []
-    for _, row in discrepancy_df.iterrows():
-        events.append({
-            "timestamp": row['timestamp'].isoformat(),
+    events = [
+        {
+            "timestamp": timestamp,
             "event_id": "E003",
             "event_data": {
                 "event_name": "Weight Discrepancies",
-                "station_id": row['station_id'],
-                "customer_id": row['customer_id'],
-                "product_sku": row['sku'],
-                "expected_weight": row['weight'],
-                "actual_weight": row['weight_g']
+                "station_id": station_id,
+                "customer_id": customer_id,
+                "product_sku": sku,
+                "expected_weight": weight_lookup[sku],
+                "actual_weight": weight_g
             }
-        })
+        }
+        for timestamp, station_id, customer_id, sku, weight_g in _event_rows(discrepancy_df, ['timestamp', 'station_id', 'customer_id', 'sku', 'weight_g'])
+    ]
 
     return events
 
-def detect_system_crashes(station_data, threshold_seconds=120):
+def detect_system_crashes(station_df, threshold_seconds=120, last_heartbeats=None):
     """
     Detects unexpected system crashes or downtime by checking for heartbeat gaps.
     Event E004.
+
+    To process the stream in chunks, pass the same `last_heartbeats` dict on every
+    call; it carries the latest heartbeat per station (as int64 ns) across chunk boundaries.
     """
     # @algorithm System Crash Detection | Identifies periods where a station is unexpectedly offline.
     print("Detecting system crashes...")
 
-    if not station_data:
+    if station_df.empty:
         return []
 
-    df = pd.DataFrame(station_data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df = df.sort_values(by=['station_id', 'timestamp'])
-
-    # Calculate time difference between consecutive heartbeats for each station
-    df['time_diff_seconds'] = df.groupby('station_id')['timestamp'].diff().dt.total_seconds()
-
-    # Filter for gaps that exceed the threshold
-    crashes_df = df[df['time_diff_seconds'] > threshold_seconds]
-
-    events = []
-    for _, row in crashes_df.iterrows():
-        events.append({
-            "timestamp": row['timestamp'].isoformat(),
+    df = station_df[['station_id', 'timestamp', 'ts_ns']]
+    if last_heartbeats:
+        carried_ts_ns = np.fromiter(last_heartbeats.values(), dtype=np.int64, count=len(last_heartbeats))
+        carried_df = pd.DataFrame({
+            'station_id': list(last_heartbeats.keys()),
+            # ts_ns counts from the UTC epoch; convert back to the chunk's time zone
+            # (tz-naive when it has none) so the concatenated column keeps one dtype
+            'timestamp': pd.to_datetime(carried_ts_ns, unit='ns', utc=True).tz_convert(station_df['timestamp'].dt.tz),
+            'ts_ns': carried_ts_ns
+        })
+        df = pd.concat([carried_df, df], ignore_index=True)
+    df = df.sort_values('ts_ns', kind='stable')
+
+    # Time difference between consecutive heartbeats of each station; a single stable
+    # sort on ts_ns keeps every station's heartbeats in order for the groupby.
+    # The first heartbeat of a station has no predecessor and is masked out.
+    prev_ts_ns = df.groupby('station_id', observed=True, sort=False)['ts_ns'].shift(1, fill_value=0).to_numpy()
+    gaps_ns = df['ts_ns'].to_numpy() - prev_ts_ns
+    has_prev = df['station_id'].duplicated().to_numpy()
+    if last_heartbeats is not None:
+        last_heartbeats.update(df.groupby('station_id', observed=True)['ts_ns'].max().to_dict())
+
+    # Filter for gaps that exceed the threshold, comparing int64 nanoseconds
+    is_crash = has_prev & (gaps_ns > threshold_seconds * NS_PER_SECOND)
+    crashes_df = df[is_crash].assign(duration_seconds=gaps_ns[is_crash] // NS_PER_SECOND)
+
+    events = [
+        {
+            "timestamp": row['timestamp'],
             "event_id": "E004",
             "event_data": {
                 "event_name": "Unexpected Systems Crash",
                 "station_id": row['station_id'],
-                "duration_seconds": int(row['time_diff_seconds'])
+                "duration_seconds": row['duration_seconds']
             }
-        })
+        }
+        for row in _event_records(crashes_df, ['timestamp', 'station_id', 'duration_seconds'])
+    ]
 
     return events
 
-def detect_long_queue_length(queue_data, threshold=5):
+def detect_long_queue_length(queue_df, threshold=5):
     """
     Detects when the queue length at a station exceeds a threshold.
     Event E005.
@@ -205,29 +262,26 @@ def detect_long_queue_length(queue_data, threshold=5):
     # @algorithm Long Queue Detection | Monitors customer count and flags when it's too high.
     print("Detecting long queue lengths...")
 
-    if not queue_data:
+    if queue_df.empty:
         return []
 
-    df = pd.DataFrame(queue_data)
-    df = pd.concat([df.drop(['data'], axis=1), df['data'].apply(pd.Series)], axis=1)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-
-    long_queues_df = df[df['customer_count'] > threshold]
+    long_queues_df = queue_df[queue_df['customer_count'] > threshold]
 
-    events = []
-    for _, row in long_queues_df.iterrows():
-        events.append({
-            "timestamp": row['timestamp'].isoformat(),
+    events = [
+        {
+            "timestamp": row['timestamp'],
             "event_id": "E005",
             "event_data": {
                 "event_name": "Long Queue Length",
                 "station_id": row['station_id'],
                 "num_of_customers": int(row['customer_count'])
             }
-        })
+        }
+        for row in _event_records(long_queues_df, ['timestamp', 'station_id', 'customer_count'])
+    ]
     return events
 
-def detect_long_wait_time(queue_data, threshold_seconds=300):
+def detect_long_wait_time(queue_df, threshold_seconds=300):
     """
     Detects when customer wait time at a station exceeds a threshold.
     Event E006.
@@ -235,29 +289,26 @@ def detect_long_wait_time(queue_data, threshold_seconds=300):
     # @algorithm Long Wait Time Detection | Monitors average dwell time and flags when it's excessive.
     print("Detecting long wait times...")
 
-    if not queue_data:
+    if queue_df.empty:
         return []
 
-    df = pd.DataFrame(queue_data)
-    df = pd.concat([df.drop(['data'], axis=1), df['data'].apply(pd.Series)], axis=1)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-
-    long_waits_df = df[df['average_dwell_time'] > threshold_seconds]
+    long_waits_df = queue_df[queue_df['average_dwell_time'] > threshold_seconds]
 
-    events = []
-    for _, row in long_waits_df.iterrows():
-        events.append({
-            "timestamp": row['timestamp'].isoformat(),
+    events = [
+        {
+            "timestamp": row['timestamp'],
             "event_id": "E006",
             "event_data": {
                 "event_name": "Long Wait Time",
                 "station_id": row['station_id'],
                 "wait_time_seconds": int(row['average_dwell_time'])
             }
-        })
+        }
+        for row in _event_records(long_waits_df, ['timestamp', 'station_id', 'average_dwell_time'])
+    ]
     return events
 
-def detect_inventory_discrepancy(inventory_snapshots, pos_data):
+def detect_inventory_discrepancy(inventory_df, pos_df):
     """
     Detects discrepancies between expected and actual inventory.
     Event E007.
@@ -265,58 +316,59 @@ def detect_inventory_discrepancy(inventory_snapshots, pos_data):
     # @algorithm Inventory Discrepancy | Compares inventory snapshots against sales data to find mismatches.
     print("Detecting inventory discrepancies...")
 
-    if not inventory_snapshots or not pos_data:
+    if inventory_df.empty or pos_df.empty:
         return []
 
-    # Process inventory snapshots into a long format DataFrame
-    inventory_records = []
-    for snapshot in inventory_snapshots:
-        ts = snapshot['timestamp']
-        for sku, count in snapshot['data'].items():
-            inventory_records.append({'timestamp': ts, 'SKU': sku, 'Actual_Inventory': count})
+    # Process inventory snapshots (one column per SKU) into a long format DataFrame
+    inventory_df_long = inventory_df.melt(
+        id_vars=['timestamp', 'ts_ns'], var_name='SKU', value_name='Actual_Inventory'
+    ).dropna(subset=['Actual_Inventory'])
+    inventory_df_long['SKU'] = inventory_df_long['SKU'].astype('category')
 
-    if not inventory_records:
+    if inventory_df_long.empty:
         return []
 
-    inventory_df_long = pd.DataFrame(inventory_records)
-    inventory_df_long['timestamp'] = pd.to_datetime(inventory_df_long['timestamp'])
-    inventory_df_long = inventory_df_long.sort_values(['SKU', 'timestamp'])
+    inventory_df_long = inventory_df_long.sort_values(['SKU', 'ts_ns'])
 
     # Calculate inventory drop and time window between snapshots for each SKU
-    inventory_df_long['prev_inventory'] = inventory_df_long.groupby('SKU')['Actual_Inventory'].shift(1)
-    inventory_df_long['prev_timestamp'] = inventory_df_long.groupby('SKU')['timestamp'].shift(1)
+    inventory_df_long['prev_inventory'] = inventory_df_long.groupby('SKU', observed=True)['Actual_Inventory'].shift(1)
+    # The fill value only lands on each SKU's first snapshot, which is dropped with prev_inventory
+    inventory_df_long['prev_ts_ns'] = inventory_df_long.groupby('SKU', observed=True)['ts_ns'].shift(1, fill_value=0)
     inventory_df_long['actual_drop'] = inventory_df_long['prev_inventory'] - inventory_df_long['Actual_Inventory']
-    inventory_df_long = inventory_df_long.dropna(subset=['prev_inventory', 'prev_timestamp'])
-
-    # Process POS data
-    pos_df = pd.DataFrame(pos_data)
-    pos_df = pd.concat([pos_df.drop(['data'], axis=1), pos_df['data'].apply(pd.Series)], axis=1)
-    pos_df['timestamp'] = pd.to_datetime(pos_df['timestamp'])
-
-    # Calculate items sold in each interval. This is slow but robust.
-    def calculate_sales(row, pos_df):
-        sales = pos_df[
-            (pos_df['sku'] == row['SKU']) &
-            (pos_df['timestamp'] > row['prev_timestamp']) &
-            (pos_df['timestamp'] <= row['timestamp'])
-        ].shape[0]
-        return sales
-
-    inventory_df_long['items_sold'] = inventory_df_long.apply(lambda row: calculate_sales(row, pos_df), axis=1)
+    inventory_df_long = inventory_df_long.dropna(subset=['prev_inventory'])
+
+    # Count items sold in each (prev_ts_ns, ts_ns] interval by binary searching
+    # the sorted sale times of each SKU
+    sale_times = {
+        sku: np.sort(group['ts_ns'].to_numpy())
+        for sku, group in pos_df.groupby('sku', observed=True)
+    }
+    items_sold = np.zeros(len(inventory_df_long), dtype=np.int64)
+    for sku, positions in inventory_df_long.groupby('SKU', observed=True, sort=False).indices.items():
+        times = sale_times.get(sku)
+        if times is None:
+            continue
+        group = inventory_df_long.iloc[positions]
+        left = np.searchsorted(times, group['prev_ts_ns'].to_numpy(), side='right')
+        right = np.searchsorted(times, group['ts_ns'].to_numpy(), side='right')
+        items_sold[positions] = right - left
+    inventory_df_long['items_sold'] = items_sold
 
     # Find discrepancies where the actual drop does not match the sold items
     discrepancy_df = inventory_df_long[inventory_df_long['actual_drop'] != inventory_df_long['items_sold']]
+    discrepancy_df = discrepancy_df.assign(Expected_Inventory=discrepancy_df['prev_inventory'] - discrepancy_df['items_sold'])
 
-    events = []
-    for _, row in discrepancy_df.iterrows():
-        events.append({
-            "timestamp": row['timestamp'].isoformat(),
+    events = [
+        {
+            "timestamp": row['timestamp'],
             "event_id": "E007",
             "event_data": {
                 "event_name": "Inventory Discrepancy",
                 "SKU": row['SKU'],
-                "Expected_Inventory": int(row['prev_inventory'] - row['items_sold']),
+                "Expected_Inventory": int(row['Expected_Inventory']),
                 "Actual_Inventory": int(row['Actual_Inventory'])
             }
-        })
+        }
+        for row in _event_records(discrepancy_df, ['timestamp', 'SKU', 'Expected_Inventory', 'Actual_Inventory'])
+    ]
     return events
\ No newline at end of file
@@ -1,5 +1,9 @@
 import os
-import json
+import itertools
+import numpy as np
+import orjson
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from data_loader import load_csv_data
 import event_detector
 
@@ -9,19 +13,124 @@ project_root = os.path.abspath(os.path.join(script_dir, '..'))
 DATA_DIR = os.path.join(project_root, '..', 'data/input')
 OUTPUT_DIR = os.path.join(project_root, 'evidence/output/test') # Default to test
 
-def load_streaming_data(data_dir):
-    """Loads all JSONL streaming data into a dictionary of lists."""
-    streams = {}
+# High-volume sensor streams are processed in fixed-size chunks to bound peak memory.
+CHUNKED_STREAMS = ('queue_monitoring', 'rfid_readings')
+CHUNK_SIZE = 100_000
+READ_BUFFER_SIZE = 1 << 20
+
+# Low-cardinality identifier columns are stored as categoricals to save memory
+# and speed up groupby and merge on them.
+CATEGORICAL_COLUMNS = ('station_id', 'sku', 'customer_id', 'location')
+
+def parse_record(line):
+    """Parses one JSONL line, merging its nested 'data' payload into the top level."""
+    record = orjson.loads(line)
+    record.update(record.pop('data', None) or {})
+    return record
+
+def _to_flat_df(records, category_dtypes=None):
+    """
+    Builds a DataFrame from flat records, parsing timestamps and categorizing identifiers once.
+    Alongside the parsed 'timestamp', an int64 'ts_ns' column holds nanoseconds since the epoch.
+
+    Columns found in `category_dtypes` are encoded with those shared categories, which are
+    only extended when the records hold values they do not cover.
+    """
+    df = pd.DataFrame.from_records(records)
+    if not df.empty:
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        # Integer nanoseconds for comparisons; 'timestamp' is kept for event output
+        df['ts_ns'] = df['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    for col in CATEGORICAL_COLUMNS:
+        if col in df:
+            df[col] = df[col].astype('category')
+            if category_dtypes and col in category_dtypes:
+                df[col] = df[col].astype(_covering_dtype(category_dtypes[col], df[col].cat.categories))
+    return df
+
+def _covering_dtype(dtype, categories):
+    """Returns `dtype` if it covers `categories`, else a copy extended with the missing ones."""
+    if categories.isin(dtype.categories).all():
+        return dtype
+    return pd.CategoricalDtype(dtype.categories.union(categories))
+
+def _shared_category_dtypes(frames, skus):
+    """Builds one station_id and one sku CategoricalDtype covering `frames` and the product SKUs."""
+    stations = pd.Index([], dtype=object)
+    all_skus = pd.Index(skus)
+    for df in frames:
+        if 'station_id' in df:
+            stations = stations.union(df['station_id'].cat.categories)
+        if 'sku' in df:
+            all_skus = all_skus.union(df['sku'].cat.categories)
+    return {'station_id': pd.CategoricalDtype(stations), 'sku': pd.CategoricalDtype(all_skus)}
+
+def _parse_jsonl(path):
+    """Parses a whole JSONL file into a list of flat records, reading it in 1 MiB blocks."""
+    with open(path, 'rb', buffering=READ_BUFFER_SIZE) as f:
+        return [parse_record(line) for line in f]
+
+def load_streaming_data(data_dir, exclude=CHUNKED_STREAMS):
+    """
+    Loads the JSONL streaming data into a dictionary of lists.
+
+    Every stream is a list of flat dicts; build its DataFrame with _to_flat_df.
+    Streams named in `exclude` are skipped; read them with iter_stream_chunks.
+    Files are read on a thread pool so disk reads overlap with parsing.
+    """
+    paths = {}
     for filename in os.listdir(data_dir):
         if filename.endswith('.jsonl'):
             stream_name = filename.replace('.jsonl', '')
-            streams[stream_name] = []
-            with open(os.path.join(data_dir, filename), 'r') as f:
-                for line in f:
-                    streams[stream_name].append(json.loads(line))
+            if stream_name not in exclude:
+                paths[stream_name] = os.path.join(data_dir, filename)
+    with ThreadPoolExecutor(max_workers=max(len(paths), 1)) as pool:
+        streams = dict(zip(paths, pool.map(_parse_jsonl, paths.values())))
     print("Successfully loaded all streaming data files.")
     return streams
 
+def iter_stream_chunks(data_dir, stream_name, chunksize=CHUNK_SIZE, category_dtypes=None):
+    """Yields a JSONL stream as DataFrames of at most `chunksize` rows."""
+    path = os.path.join(data_dir, f'{stream_name}.jsonl')
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb', buffering=READ_BUFFER_SIZE) as f:
+        while True:
+            chunk = [parse_record(line) for line in itertools.islice(f, chunksize)]
+            if not chunk:
+                return
+            yield _to_flat_df(chunk, category_dtypes)
+
+# Read-only state shared with every detector worker process, set once by _init_worker.
+_WORKER = {}
+
+def _init_worker(category_dtypes, weight_lookup):
+    """Stores the shared lookups in a worker process so they are not re-pickled per task."""
+    _WORKER.update(category_dtypes=category_dtypes, weight_lookup=weight_lookup)
+
+def _detect_weight_discrepancies(pos_df):
+    return event_detector.detect_weight_discrepancies(pos_df, _WORKER['weight_lookup'])
+
+def _detect_queue_events(data_dir):
+    """
+    Runs the queue_monitoring detectors over a single pass of the stream's chunks.
+    Returns crash, long queue and long wait events, in that order.
+    """
+    crash_events, queue_events, wait_events = [], [], []
+    last_heartbeats = {}
+    for queue_chunk in iter_stream_chunks(data_dir, 'queue_monitoring', category_dtypes=_WORKER.get('category_dtypes')):
+        crash_events.extend(event_detector.detect_system_crashes(queue_chunk, last_heartbeats=last_heartbeats))
+        queue_events.extend(event_detector.detect_long_queue_length(queue_chunk))
+        wait_events.extend(event_detector.detect_long_wait_time(queue_chunk))
+    return crash_events + queue_events + wait_events
+
+def _run_chunked(detector, data_dir, stream_name, chunk_arg, **kwargs):
+    """Runs a detector over every chunk of a stream, passing the chunk as `chunk_arg`."""
+    events = []
+    for chunk in iter_stream_chunks(data_dir, stream_name, category_dtypes=_WORKER.get('category_dtypes')):
+        events.extend(detector(**{chunk_arg: chunk}, **kwargs))
+    return events
+
 def run_pipeline():
     """
     Main function to run the entire data processing pipeline.
@@ -36,23 +145,45 @@ def run_pipeline():
         print(f"Error: Could not find data files in {os.path.abspath(DATA_DIR)}")
         return
 
-    all_events = []
+    # Expected weight per SKU, the only product data the detectors need
+    weight_lookup = products_df.set_index('SKU')['weight'].to_dict()
+
+    # Build each stream's DataFrame once and share it between detectors.
+    pos_df = _to_flat_df(streaming_data.get('pos_transactions', []))
+    vision_df = _to_flat_df(streaming_data.get('product_recognition', []))
+    inventory_df = _to_flat_df(streaming_data.get('inventory_snapshots', []))
+
+    # Encode station and SKU identifiers with one shared set of categories, so the
+    # frames (and the chunks read in the workers) merge on matching integer codes.
+    category_dtypes = _shared_category_dtypes([pos_df, vision_df], products_df['SKU'].dropna())
+    pos_df = pos_df.astype({col: dtype for col, dtype in category_dtypes.items() if col in pos_df})
+    vision_df = vision_df.astype({col: dtype for col, dtype in category_dtypes.items() if col in vision_df})
+
+    # The detectors share no state, so each runs as its own task. The high-volume
+    # feeds are streamed chunk by chunk inside the worker; only the events come back.
+    # The queue_monitoring detectors share one task so that stream is parsed only once.
+    detectors = [
+        (_run_chunked, (event_detector.detect_scanner_avoidance, DATA_DIR, 'rfid_readings', 'rfid_df'), {'pos_df': pos_df}),
+        (event_detector.detect_barcode_switching, (vision_df, pos_df), {}),
+        (_detect_weight_discrepancies, (pos_df,), {}),
+        (_detect_queue_events, (DATA_DIR,), {}),
+        (event_detector.detect_inventory_discrepancy, (inventory_df, pos_df), {}),
+    ]
 
     # Run all event detectors
-    all_events.extend(event_detector.detect_scanner_avoidance(streaming_data.get('pos_transactions'), streaming_data.get('rfid_readings')))
-    all_events.extend(event_detector.detect_barcode_switching(streaming_data.get('product_recognition'), streaming_data.get('pos_transactions')))
-    all_events.extend(event_detector.detect_weight_discrepancies(streaming_data.get('pos_transactions'), products_df))
-    all_events.extend(event_detector.detect_system_crashes(streaming_data.get('queue_monitoring'))) # Example, might need more streams
-    all_events.extend(event_detector.detect_long_queue_length(streaming_data.get('queue_monitoring')))
-    all_events.extend(event_detector.detect_long_wait_time(streaming_data.get('queue_monitoring')))
-    all_events.extend(event_detector.detect_inventory_discrepancy(streaming_data.get('inventory_snapshots'), streaming_data.get('pos_transactions')))
+    with ProcessPoolExecutor(
+        max_workers=min(len(detectors), os.cpu_count() or 1),
+        initializer=_init_worker,
+        initargs=(category_dtypes, weight_lookup)
+    ) as pool:
+        futures = [pool.submit(fn, *args, **kwargs) for fn, args, kwargs in detectors]
+        all_events = list(itertools.chain.from_iterable(future.result() for future in futures))
 
     # Save events to output file
     output_path = os.path.join(OUTPUT_DIR, 'events.jsonl')
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    with open(output_path, 'w') as f:
-        for event in all_events:
-            f.write(json.dumps(event) + '\n')
+    with open(output_path, 'wb') as f:
+        f.write(b''.join(orjson.dumps(event, option=orjson.OPT_APPEND_NEWLINE) for event in all_events))
 
     print(f"Pipeline complete. Found {len(all_events)} events.")
     print(f"Output saved to {output_path}")
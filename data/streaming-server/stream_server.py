@@ -7,7 +7,8 @@ receives newline-delimited JSON objects that report the dataset name,
 sequence number, adjusted timestamp, and payload.
 
 The implementation uses only Python's standard library so it runs on
-Windows, macOS, and Linux without additional dependencies.
+Windows, macOS, and Linux without additional dependencies. When the optional
+`orjson` package is installed it is used for faster JSON parsing and encoding.
 
 Example usage:
     python stream_server.py --port 8765 --speed 1.0
@@ -17,15 +18,36 @@ Example usage:
 from __future__ import annotations
 
 import argparse
+import heapq
+import itertools
 import json
 import logging
+import mmap
+import operator
+import os
+import socket
 import socketserver
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Iterable, List, Dict, Any, Optional
+from typing import Iterable, List, Dict, Any, NamedTuple, Optional, Sequence
 
+try:
+    import orjson
+except ImportError:  # orjson is an optional speedup
+    orjson = None
+
+if orjson is not None:
+    _loads = orjson.loads
+    _dumps = orjson.dumps
+else:
+    _loads = json.loads
+
+    def _dumps(obj: Any) -> bytes:
+        # Match orjson's compact UTF-8 output so frames look the same either way.
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
 
 DATASET_ALIASES: Dict[str, str] = {
     "POS_Transactions": "pos_transactions",
@@ -78,6 +100,61 @@ def discover_dataset_paths(data_root: Path) -> List[Path]:
 
 LOGGER = logging.getLogger("stream_server")
 
+# Frames are assembled from bytes precomputed per event; only the sequence
+# number and the adjusted timestamp (which appears twice) are filled in at send
+# time, so the send loop makes no JSON calls.
+FRAME_TIMESTAMP_FIELD = b',"timestamp":"'
+FRAME_END = b"}\n"
+
+# Stands in for the adjusted timestamp in each pre-serialized event payload.
+TIMESTAMP_PLACEHOLDER = "__SENTINEL_TIMESTAMP__"
+TIMESTAMP_PLACEHOLDER_BYTES = TIMESTAMP_PLACEHOLDER.encode("ascii")
+
+# Frames are queued as their FRAME_PARTS separate buffers and written with one
+# gather write (sendmsg) per MAX_SEND_BUFFERS buffers, the usual IOV_MAX limit.
+# Pending frames are flushed before every sleep so that they are never held
+# back behind a real gap in the feed.
+FRAME_PARTS = 7
+MAX_SEND_BUFFERS = 1024
+
+# Kernel send buffer requested for each client socket.
+SOCKET_SEND_BUFFER_SIZE = 1 << 20
+
+# Waits shorter than this are skipped rather than slept: the OS scheduler cannot
+# honour them (Windows rounds sleeps up to ~15 ms) and the next deadline is
+# absolute, so skipping them never accumulates drift.
+MIN_SLEEP_SECONDS = 0.0005
+
+# Gaps between events are scheduled in integer microseconds at 1x speed.
+ONE_MICROSECOND = timedelta(microseconds=1)
+MIN_GAP_MICROSECONDS = 100_000  # Minimum 0.1 second gap at 1x speed
+
+# Number of looped cycles whose formatted timestamps the server keeps cached.
+CYCLE_ISO_CACHE_SIZE = 4
+
+
+def send_buffers(sock: Any, buffers: List[bytes]) -> None:
+    """Send `buffers` in order with gather writes, retrying partial sends.
+
+    Falls back to a single sendall on platforms without socket.sendmsg.
+    """
+
+    if not hasattr(sock, "sendmsg"):
+        sock.sendall(b"".join(buffers))
+        return
+    for start in range(0, len(buffers), MAX_SEND_BUFFERS):
+        batch: List[Any] = buffers[start : start + MAX_SEND_BUFFERS]
+        while batch:
+            sent = sock.sendmsg(batch)
+            # Drop the buffers that went out in full and trim a partial one.
+            index = 0
+            while index < len(batch) and sent >= len(batch[index]):
+                sent -= len(batch[index])
+                index += 1
+            batch = batch[index:]
+            if batch and sent:
+                batch[0] = memoryview(batch[0])[sent:]
+
 
 def load_events(dataset_path: Path) -> List[Dict[str, Any]]:
     """Load events from the JSON dataset.
@@ -85,12 +162,25 @@ def load_events(dataset_path: Path) -> List[Dict[str, Any]]:
     Supports list-based JSON files, dictionaries with an `events` list,
     JSONL files, or single JSON objects (which are treated as single events).
     """
-    with dataset_path.open("r", encoding="utf-8") as handle:
-        try:
-            payload = json.load(handle)
-        except json.JSONDecodeError:
-            handle.seek(0)
-            payload = [json.loads(line) for line in handle if line.strip()]
+    with dataset_path.open("rb") as handle:
+        # mmap cannot map an empty file; like a blank JSONL file it has no events.
+        if os.fstat(handle.fileno()).st_size == 0:
+            return []
+        # The file is read through a memory map so JSONL lines are parsed
+        # straight from the page cache without first copying the whole file.
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            lines = (line for line in iter(mapped.readline, b"") if line.strip())
+            first_line = next(lines, None)
+            if first_line is None:
+                return []
+            try:
+                first = _loads(first_line)
+            except json.JSONDecodeError:  # orjson.JSONDecodeError subclasses it
+                # Not JSONL: a JSON document spread over several lines.
+                payload = _loads(mapped[:])
+            else:
+                rest = [_loads(line) for line in lines]
+                payload = [first, *rest] if rest else first
 
     if isinstance(payload, list):
         return payload
@@ -118,44 +208,135 @@ def parse_timestamp(value: Any, dataset: str, source: Path) -> datetime:
         ) from exc
 
 
+class EventColumns(NamedTuple):
+    """Events stored as parallel sequences (one entry per event).
+
+    load_dataset returns one chronologically sorted instance per file. collect_events
+    merges them into a single chronologically sorted instance of tuples, which
+    is shared read-only by every client connection; handlers must never mutate it.
+    """
+
+    timestamps: Sequence[datetime]
+    iso_timestamps: Sequence[bytes]
+    prefixes: Sequence[bytes]
+    middles: Sequence[bytes]
+    tails: Sequence[bytes]
+
+
+def schedule_gap_us(delta: timedelta) -> int:
+    """Return the gap at 1x speed, in whole microseconds, between two events `delta` apart."""
+
+    gap = delta // ONE_MICROSECOND
+    # Ensure minimum gap between events to prevent flooding
+    return gap if gap > 0 else MIN_GAP_MICROSECONDS
+
+
+def build_payload_template(event: Dict[str, Any]) -> bytes:
+    """Serialize an event once, with TIMESTAMP_PLACEHOLDER as its timestamp."""
+
+    return _dumps({**event, "timestamp": TIMESTAMP_PLACEHOLDER})
+
+
+def build_frame_prefix(dataset: str) -> bytes:
+    """Serialize the bytes preceding the sequence number, shared by a dataset's frames."""
+
+    return b'{"dataset":' + _dumps(dataset) + b',"sequence":'
+
+
+def build_frame_body(event: Dict[str, Any]) -> tuple[bytes, bytes]:
+    """Serialize the rest of an event's frame around the adjusted timestamp in its payload.
+
+    Returns the bytes from the end of the frame's adjusted timestamp up to the
+    payload's timestamp value, and the bytes after that value to the end of the frame.
+    """
+
+    head, _, tail = build_payload_template(event).partition(TIMESTAMP_PLACEHOLDER_BYTES)
+    middle = b'","original_timestamp":' + _dumps(event.get("timestamp")) + b',"event":' + head
+    return middle, tail + FRAME_END
+
+
+def load_dataset(path: Path) -> tuple[str, Optional[EventColumns]]:
+    """Load one dataset file and precompute its frame parts, sorted by timestamp.
+
+    Returns the canonical dataset name and its columns, or None when the file
+    holds no events.
+    """
+
+    dataset_name = FILENAME_TO_CANONICAL.get(path.stem, path.stem)
+    raw_events = load_events(path)
+    if not raw_events:
+        LOGGER.warning("Dataset %s contained no events", path)
+        return dataset_name, None
+
+    timestamps: List[datetime] = []
+    # Sensor feeds report many events per instant, so each distinct timestamp
+    # string is parsed only once.
+    parsed_timestamps: Dict[str, datetime] = {}
+    for event in raw_events:
+        raw_timestamp = event.get("timestamp")
+        ts = parsed_timestamps.get(raw_timestamp) if isinstance(raw_timestamp, str) else None
+        if ts is None:
+            ts = parse_timestamp(raw_timestamp, dataset_name, path)
+            parsed_timestamps[raw_timestamp] = ts
+        timestamps.append(ts)
+
+    # Feeds are normally recorded in order; only sort the ones that are not.
+    # The sort is stable, so events sharing a timestamp keep their file order.
+    if any(later < earlier for earlier, later in zip(timestamps, timestamps[1:])):
+        order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+        timestamps = [timestamps[i] for i in order]
+        raw_events = [raw_events[i] for i in order]
+
+    # Every frame of a dataset shares one prefix object.
+    prefix = build_frame_prefix(dataset_name)
+    bodies = [build_frame_body(event) for event in raw_events]
+    middles = [middle for middle, _ in bodies]
+    tails = [tail for _, tail in bodies]
+    columns = EventColumns(
+        timestamps=timestamps,
+        iso_timestamps=[ts.isoformat().encode() for ts in timestamps],
+        prefixes=[prefix] * len(raw_events),
+        middles=middles,
+        tails=tails,
+    )
+    return dataset_name, columns
+
+
 def collect_events(
     dataset_paths: Iterable[Path],
-) -> tuple[List[Dict[str, Any]], List[str]]:
+) -> tuple[EventColumns, List[str]]:
     """Load and sort all events from the provided dataset files."""
 
-    all_events: List[Dict[str, Any]] = []
-    dataset_names: List[str] = []
-
-    for path in dataset_paths:
-        dataset_name = FILENAME_TO_CANONICAL.get(path.stem, path.stem)
-        dataset_names.append(dataset_name)
-        raw_events = load_events(path)
-        if not raw_events:
-            LOGGER.warning("Dataset %s contained no events", path)
-            continue
+    dataset_paths = list(dataset_paths)
+    # Files are read on a thread pool so their disk reads overlap.
+    with ThreadPoolExecutor(max_workers=max(min(len(dataset_paths), 8), 1)) as pool:
+        loaded = list(pool.map(load_dataset, dataset_paths))
 
-        for event in raw_events:
-            ts = parse_timestamp(event.get("timestamp"), dataset_name, path)
-            all_events.append(
-                {
-                    "dataset": dataset_name,
-                    "timestamp": ts,
-                    "payload": event,
-                }
-            )
-
-    if not all_events:
+    dataset_names = [dataset_name for dataset_name, _ in loaded]
+    datasets = [columns for _, columns in loaded if columns is not None]
+    if not datasets:
         raise ValueError("No events found across provided datasets.")
 
-    all_events.sort(key=lambda item: item["timestamp"])
-    return all_events, dataset_names
+    # Each dataset is already sorted, so a k-way merge of their rows orders the
+    # whole feed. Ties go to the dataset listed first, as with a stable sort.
+    rows = heapq.merge(*(zip(*columns) for columns in datasets), key=operator.itemgetter(0))
+    events = EventColumns(*map(tuple, zip(*rows)))
+    return events, dataset_names
 
 
 class EventStreamRequestHandler(socketserver.BaseRequestHandler):
     """Handle an inbound TCP connection and stream events."""
 
+    def setup(self) -> None:
+        super().setup()
+        # Frames are already batched before each send, so Nagle's algorithm
+        # would only delay them; a larger kernel buffer lets sends return sooner.
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.request.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_SEND_BUFFER_SIZE)
+
     def handle(self) -> None:  # type: ignore[override]
         server: ReplayTCPServer = self.server  # type: ignore[assignment]
+        events = server.events
         client_host, client_port = self.client_address
         LOGGER.info("Client connected from %s:%s", client_host, client_port)
 
@@ -163,53 +344,73 @@ class EventStreamRequestHandler(socketserver.BaseRequestHandler):
         banner = {
             "service": "project-sentinel-event-stream",
             "datasets": server.dataset_names,
-            "events": len(server.events),
+            "events": len(events.timestamps),
             "loop": server.loop,
             "speed_factor": server.speed,
             "cycle_seconds": server.cycle_span.total_seconds(),
             "schema": "newline-delimited JSON objects",
         }
-        self.request.sendall(json.dumps(banner).encode("utf-8") + b"\n")
+        self.request.sendall(_dumps(banner) + b"\n")
+
+        # Bind everything the send loop touches to locals once per connection.
+        request = self.request
+        monotonic = time.monotonic
+        sleep = time.sleep
+        loop = server.loop
+        offsets = server.offsets
+        wrap_gap = server.wrap_gap
 
         try:
             loop_index = 0
-            previous_emitted: Optional[datetime] = None
             sequence = 1
+            pending: List[bytes] = []
+            # Frames are scheduled against absolute monotonic deadlines, so time
+            # spent formatting and sending is not added on top of each gap.
+            cycle_start = monotonic()
             while True:
                 LOGGER.info("Starting loop cycle %d", loop_index + 1)
-                for record in server.events:
-                    adjusted_timestamp: datetime = record["timestamp"] + (
-                        server.cycle_span * loop_index
+                cycle_isos = server.cycle_iso_timestamps(loop_index)
+                for offset, adjusted_iso, prefix, middle, tail in zip(
+                    offsets,
+                    cycle_isos,
+                    events.prefixes,
+                    events.middles,
+                    events.tails,
+                ):
+                    remaining = cycle_start + offset - monotonic()
+                    if remaining > MIN_SLEEP_SECONDS:
+                        if pending:
+                            send_buffers(request, pending)
+                            pending.clear()
+                            # The flush may have taken a while; sleep only what is left.
+                            remaining = cycle_start + offset - monotonic()
+                        if remaining > 0:
+                            sleep(remaining)
+
+                    pending += (
+                        prefix,
+                        b"%d" % sequence,
+                        FRAME_TIMESTAMP_FIELD,
+                        adjusted_iso,
+                        middle,
+                        adjusted_iso,
+                        tail,
                     )
-
-                    if previous_emitted is not None:
-                        delta = (adjusted_timestamp - previous_emitted).total_seconds()
-                        adjusted = delta / server.speed if server.speed > 0 else 0
-                        # Ensure minimum gap between events to prevent flooding
-                        if adjusted <= 0:
-                            adjusted = 0.1 / server.speed  # Minimum 0.1 second gap at 1x speed
-                        time.sleep(adjusted)
-                    previous_emitted = adjusted_timestamp
-
-                    original_timestamp = record["payload"].get("timestamp")
-                    event_copy = dict(record["payload"])
-                    event_copy["timestamp"] = adjusted_timestamp.isoformat()
-
-                    frame = {
-                        "dataset": record["dataset"],
-                        "sequence": sequence,
-                        "timestamp": adjusted_timestamp.isoformat(),
-                        "original_timestamp": original_timestamp,
-                        "event": event_copy,
-                    }
-                    self.request.sendall(json.dumps(frame).encode("utf-8") + b"\n")
+                    if len(pending) > MAX_SEND_BUFFERS - FRAME_PARTS:
+                        send_buffers(request, pending)
+                        pending.clear()
                     sequence += 1
 
-                if not server.loop:
+                if pending:
+                    send_buffers(request, pending)
+                    pending.clear()
+
+                if not loop:
                     LOGGER.info("Loop disabled, ending stream")
                     break
 
                 loop_index += 1
+                cycle_start += offsets[-1] + wrap_gap
                 LOGGER.info("Completed loop cycle %d, starting next cycle", loop_index)
         except (BrokenPipeError, ConnectionResetError):
             LOGGER.info("Client %s:%s disconnected", client_host, client_port)
@@ -223,18 +424,48 @@ class ReplayTCPServer(socketserver.ThreadingTCPServer):
     def __init__(
         self,
         server_address: tuple[str, int],
-        events: Iterable[Dict[str, Any]],
+        events: EventColumns,
         dataset_names: List[str],
         speed: float,
         loop: bool,
         cycle_span: timedelta,
     ) -> None:
         super().__init__(server_address, EventStreamRequestHandler)
-        self.events: List[Dict[str, Any]] = list(events)
+        self.events = events
         self.dataset_names = dataset_names
         self.speed = speed
         self.loop = loop
         self.cycle_span = cycle_span
+        # Every cycle replays the same gaps, so the send schedule is computed once
+        # and shared by every client: exact integer microsecond offsets from the
+        # cycle start at 1x speed, scaled to wall-clock seconds at this speed. Only
+        # the gap from the last event of one cycle to the first of the next differs.
+        timestamps = events.timestamps
+        offsets_us = itertools.accumulate(
+            (schedule_gap_us(current - previous) for previous, current in zip(timestamps, timestamps[1:])),
+            initial=0,
+        )
+        scale = 1 / (speed * 1_000_000)
+        self.offsets: Sequence[float] = tuple([offset_us * scale for offset_us in offsets_us])
+        self.wrap_gap = schedule_gap_us(timestamps[0] + cycle_span - timestamps[-1]) * scale
+        # Clients connected at the same time replay the same cycles, so each
+        # cycle's timestamps are formatted once and shared between them.
+        self._cycle_isos: Dict[int, Sequence[bytes]] = {0: events.iso_timestamps}
+        self._cycle_isos_lock = threading.Lock()
+
+    def cycle_iso_timestamps(self, loop_index: int) -> Sequence[bytes]:
+        """Return the encoded ISO timestamps of every event in the given loop cycle."""
+
+        with self._cycle_isos_lock:
+            isos = self._cycle_isos.get(loop_index)
+            if isos is None:
+                shift = self.cycle_span * loop_index
+                isos = tuple([(ts + shift).isoformat().encode() for ts in self.events.timestamps])
+                # Keep the load-time strings plus the few most recent cycles.
+                while len(self._cycle_isos) > CYCLE_ISO_CACHE_SIZE:
+                    del self._cycle_isos[min(key for key in self._cycle_isos if key)]
+                self._cycle_isos[loop_index] = isos
+            return isos
 
 
 def parse_args() -> argparse.Namespace:
@@ -308,12 +539,13 @@ def main() -> None:
 
     events, dataset_names = collect_events(dataset_paths)
 
-    first_timestamp = events[0]["timestamp"]
-    last_timestamp = events[-1]["timestamp"]
+    timestamps = events.timestamps
+    first_timestamp = timestamps[0]
+    last_timestamp = timestamps[-1]
 
     min_gap: Optional[timedelta] = None
-    for idx in range(len(events) - 1):
-        gap = events[idx + 1]["timestamp"] - events[idx]["timestamp"]
+    for idx in range(len(timestamps) - 1):
+        gap = timestamps[idx + 1] - timestamps[idx]
         if gap.total_seconds() <= 0:
             continue
         if min_gap is None or gap < min_gap:
@@ -330,7 +562,7 @@ def main() -> None:
 
     LOGGER.info(
         "Loaded %s combined events from %s dataset(s) (loop=%s, speed=%sx, cycle=%ss)",
-        len(events),
+        len(timestamps),
         len(dataset_names),
         args.loop,
         args.speed,